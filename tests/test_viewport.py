@@ -0,0 +1,320 @@
+# pytest unit tests for the UCAIR3D Viewport (offscreen Qt)
+# -----------------------------------------------------------------------------
+# The Viewport is a QWidget, so these tests need a QApplication. They run on Qt's offscreen platform, so no display
+# is needed.
+
+import importlib.util
+import os
+
+os.environ.setdefault("QT_QPA_PLATFORM", "offscreen")
+
+import numpy as np
+import nibabel as nib
+import pytest
+from PyQt5.QtWidgets import QApplication
+
+from ucair3d.components.image3D import Image3D
+from ucair3d.components import viewport as viewport_module
+from ucair3d.components.viewport import Viewport
+from ucair3d.enumerations import ViewDir
+
+# -----------------------------------------------------------------------------
+# Fixtures
+# -----------------------------------------------------------------------------
+
+class _DummyParent:
+    def __init__(self, display_convention="RAS"):
+        self.display_convention = display_convention
+        self.debug_mode = False
+
+
+@pytest.fixture(scope="module")
+def qapp():
+    return QApplication.instance() or QApplication([])
+
+
+@pytest.fixture
+def dummy_parent():
+    return _DummyParent("RAS")
+
+
+@pytest.fixture
+def make_image3d(dummy_parent, tmp_path):
+    """Factory: Image3D holding data (x, y, z) == (cols, rows, slices), with the given axis directions."""
+    def _make(data, dirs=("R", "A", "S")):
+        nifti = nib.Nifti1Image(data, np.diag([0.7, 0.8, 1.2, 1.0]))
+        test_path = tmp_path / "vol.nii.gz"
+        nib.save(nifti, str(test_path))
+        im3d = Image3D(dummy_parent)
+        im3d.populate_with_nifti(nifti, str(test_path), base_name="vol")
+        im3d.x_dir, im3d.y_dir, im3d.z_dir = dirs
+        return im3d
+    return _make
+
+
+@pytest.fixture
+def make_viewport(qapp, dummy_parent):
+    """Factory: Viewport showing the given Image3D objects as layers 0, 1, ..."""
+    viewports = []
+
+    def _make(view_dir, *images):
+        vp = Viewport(dummy_parent, "vp", view_dir, 3)
+        for layer_index, im3d in enumerate(images):
+            vp.add_layer(im3d, layer_index)
+        viewports.append(vp)
+        return vp
+
+    yield _make
+    for vp in viewports:
+        vp.close()
+        vp.deleteLater()
+
+
+@pytest.fixture
+def volume():
+    """Non-cubic (x, y, z) volume, so that a mix-up of any two axes shows."""
+    return np.random.default_rng(0).integers(0, 4, size=(10, 8, 6)).astype(np.uint8)
+
+
+def _assert_marker_index_consistent(vp):
+    """Every marker in slice_markers is in _marker_index under its id and slice, and vice versa."""
+    listed = {}
+    for slice_idx, markers in vp.slice_markers.items():
+        for marker in markers:
+            listed[marker['id']] = (slice_idx, marker)
+    assert listed.keys() == vp._marker_index.keys()
+    for marker_id, (slice_idx, marker) in vp._marker_index.items():
+        assert listed[marker_id][0] == slice_idx
+        assert listed[marker_id][1] is marker
+
+
+# -----------------------------------------------------------------------------
+# Tests
+# -----------------------------------------------------------------------------
+
+@pytest.mark.parametrize("view", [ViewDir.AX, ViewDir.SAG, ViewDir.COR])
+def test_add_markers_matches_add_marker_loop(make_image3d, make_viewport, volume, view):
+    cols, rows, slices = volume.shape
+    # in-bounds points, plus points just outside along each axis
+    points = [(0, 0, 0), (cols - 1, rows - 1, slices - 1), (3, 2, 1), (-1, 2, 1), (cols, 2, 1), (3, -1, 1),
+              (3, rows, 1), (3, 2, -1), (3, 2, slices), (5, 4, 3), (5, 4, 3)]
+    looped = make_viewport(view, make_image3d(volume))
+    bulk = make_viewport(view, make_image3d(volume))
+
+    expected = [looped.add_marker(c, r, s, 0) for c, r, s in points]
+    got = bulk.add_markers(*zip(*points), 0)
+
+    assert [m is None for m in got] == [m is None for m in expected]
+    assert [m is None for m in got] == [not (0 <= c < cols and 0 <= r < rows and 0 <= s < slices)
+                                        for c, r, s in points]
+    assert got == expected  # same ids, in the same order, and the same coordinates
+    assert {k: v for k, v in bulk.slice_markers.items() if v} == {k: v for k, v in looped.slice_markers.items() if v}
+    _assert_marker_index_consistent(bulk)
+    # ids keep counting from where add_markers() left off
+    assert bulk.add_marker(1, 1, 1, 0)['id'] == looped.add_marker(1, 1, 1, 0)['id']
+
+
+def test_add_markers_new_ids(make_image3d, make_viewport, volume):
+    vp = make_viewport(ViewDir.AX, make_image3d(volume))
+    got = vp.add_markers([1, 100, 2], [1, 1, 2], [1, 1, 2], 0, new_ids=["a", "b", "c"])
+    assert [m and m['id'] for m in got] == ["a", None, "c"]
+    assert vp.marker_find_by_id("a") is got[0]
+    assert vp.marker_find_by_id("b") is None
+    assert vp._marker_counter == 0  # caller-supplied ids don't use the counter
+    _assert_marker_index_consistent(vp)
+
+
+def test_add_markers_empty(make_image3d, make_viewport, volume):
+    vp = make_viewport(ViewDir.AX, make_image3d(volume))
+    assert vp.add_markers([], [], [], 0) == []
+    assert vp._marker_index == {}
+
+
+def test_marker_index_after_delete(make_image3d, make_viewport, volume):
+    vp = make_viewport(ViewDir.COR, make_image3d(volume))
+    markers = vp.add_markers([1, 2, 3, 4], [1, 1, 5, 5], [0, 0, 2, 2], 0)
+    vp.add_marker(2, 3, 4, 0, new_id="fixed")
+    _assert_marker_index_consistent(vp)
+
+    vp.marker_delete(markers[1]['id'])
+    vp.marker_delete("fixed")
+    vp.marker_delete("no such id")  # ignored
+    _assert_marker_index_consistent(vp)
+    assert vp.marker_find_by_id(markers[1]['id']) is None
+    assert vp.marker_find_by_id(markers[0]['id']) is markers[0]
+    assert sum(len(v) for v in vp.slice_markers.values()) == 3
+
+    vp.marker_delete_all()
+    _assert_marker_index_consistent(vp)
+    assert vp._marker_index == {}
+    assert vp.marker_find_by_id(markers[0]['id']) is None
+
+
+# coordinate conversion caches built by Viewport._rebuild_axis_maps(); with these cleared, the conversion methods take
+# their original branching code paths
+_AXIS_MAP_CACHES = ("_plot_to_image_axis_map", "_image_to_plot_axis_map", "_plotxy_affine", "_plotdatacrs_affine",
+                    "_image_to_plotdata_axis_map", "_plotdata_to_image_axis_map")
+
+
+def _branching(vp, method, *args):
+    """Call a coordinate conversion method of vp with the cached maps bypassed."""
+    saved = {name: getattr(vp, name) for name in _AXIS_MAP_CACHES + ("_crs_identity",)}
+    for name in _AXIS_MAP_CACHES:
+        setattr(vp, name, None)
+    vp._crs_identity = False
+    try:
+        return method(*args)
+    finally:
+        for name, value in saved.items():
+            setattr(vp, name, value)
+
+
+def _as_ints(crs):
+    return None if crs is None else tuple(int(v) for v in crs)
+
+
+@pytest.mark.parametrize("dirs", [(x, y, z) for x in "RL" for y in "AP" for z in "SI"])
+@pytest.mark.parametrize("view", [ViewDir.AX, ViewDir.SAG, ViewDir.COR])
+def test_axis_maps_match_branching_conversions(make_image3d, make_viewport, volume, view, dirs):
+    vp = make_viewport(view, make_image3d(volume, dirs))
+    assert vp._plot_to_image_axis_map is not None  # refresh() has built the maps
+
+    # every voxel of the (transposed) plot data, and of the Image3D data
+    plot_data_shape = vp.array3D_stack[0].shape  # (slices, cols, rows)
+    plot_grid = [(a, b, c) for a in range(plot_data_shape[1]) for b in range(plot_data_shape[2])
+                 for c in range(plot_data_shape[0])]
+    image_grid = [(a, b, c) for a in range(volume.shape[0]) for b in range(volume.shape[1])
+                  for c in range(volume.shape[2])]
+
+    for a, b, c in plot_grid:
+        assert _as_ints(vp.plotxyz_to_plotdatacrs(a, b, c)) == _as_ints(
+            _branching(vp, vp.plotxyz_to_plotdatacrs, a, b, c))
+        assert _as_ints(vp.plotdatacrs_to_imagecrs(a, b, c)) == _as_ints(
+            _branching(vp, vp.plotdatacrs_to_imagecrs, a, b, c))
+        assert _as_ints(vp.plotdatacr_to_plotxy(a, b)) == _as_ints(_branching(vp, vp.plotdatacr_to_plotxy, a, b))
+        # the fused plot (x, y, slice) -> Image3D map used by _mouse_move()
+        fused = tuple(sign * (a, b, c)[src] + offset for src, sign, offset in vp._plot_to_image_axis_map)
+        assert fused == _as_ints(_branching(vp, vp._plotxyz_to_imagecrs, a, b, c))
+
+    for a, b, c in image_grid:
+        assert _as_ints(vp.imagecrs_to_plotdatacrs(a, b, c)) == _as_ints(
+            _branching(vp, vp.imagecrs_to_plotdatacrs, a, b, c))
+
+    # vectorized: all Image3D voxels -> plot (x, y) in one call, as when drawing markers
+    cols, rows, slices = (np.array(v) for v in zip(*image_grid))
+    plot_x, plot_y = vp._imagecrs_to_plotxy_batch(cols, rows, slices)
+    expected = [_branching(vp, vp._imagecrs_to_plotxyz, a, b, c)[:2] for a, b, c in image_grid]
+    assert list(zip(plot_x.tolist(), plot_y.tolist())) == [_as_ints(xy) for xy in expected]
+    # and the array forms of the public conversions agree with their scalar forms
+    plot_data = vp.imagecrs_to_plotdatacrs(cols, rows, slices)
+    assert list(zip(*(np.broadcast_to(v, cols.shape).tolist() for v in plot_data))) == [
+        _as_ints(vp.imagecrs_to_plotdatacrs(a, b, c)) for a, b, c in image_grid]
+
+
+def test_circle_brush_footprint(make_image3d, make_viewport, volume):
+    vp = make_viewport(ViewDir.AX, make_image3d(volume))
+    vp.paint_brush.set_shape('circle')
+    # a disc of radius half_brush: the pixels whose center is within half_brush of the brush center
+    expected = np.array([[0, 0, 1, 0, 0],
+                         [0, 1, 1, 1, 0],
+                         [1, 1, 1, 1, 1],
+                         [0, 1, 1, 1, 0],
+                         [0, 0, 1, 0, 0]], dtype=bool)
+    assert np.array_equal(vp._get_brush_mask(2), expected)
+    assert np.array_equal(vp._get_brush_mask(0), [[True]])
+    vp.paint_brush.set_shape('square')
+    assert np.array_equal(vp._get_brush_mask(2), np.ones((5, 5), dtype=bool))
+
+
+def _reference_stroke(data_slice, x, y, half_brush, shape, labels, fill_value):
+    """The brush as originally written: footprint & np.isin(brush_area, canvas_labels) -> fill_value."""
+    out = data_slice.copy()
+    for i in range(-half_brush, half_brush + 1):
+        for j in range(-half_brush, half_brush + 1):
+            if shape == 'circle' and i * i + j * j > half_brush * half_brush:
+                continue
+            px, py = x + i, y + j
+            if 0 <= px < out.shape[0] and 0 <= py < out.shape[1] and np.isin(out[px, py], labels):
+                out[px, py] = fill_value
+    return out
+
+
+@pytest.mark.parametrize("use_numba", [
+    pytest.param(True, marks=pytest.mark.skipif(importlib.util.find_spec("numba") is None,
+                                                reason="numba is not installed")),
+    False])
+@pytest.mark.parametrize("dtype", [np.uint8, np.uint16, np.float32])
+@pytest.mark.parametrize("shape", ['square', 'circle'])
+def test_brush_matches_isin_reference(make_image3d, make_viewport, monkeypatch, dtype, shape, use_numba):
+    if not use_numba:
+        monkeypatch.setattr(viewport_module, "_get_stamp_brush_kernel", lambda: None)
+    values = np.array([0, 1, 2, 3], dtype=dtype)
+    if np.dtype(dtype).kind == 'f':
+        values[3] = 2.5
+    data = np.random.default_rng(1).choice(values, size=(10, 8, 6))
+    vp = make_viewport(ViewDir.AX, make_image3d(data))
+    vp.paint_set_canvas_layer_index(0)
+    # labels outside the dtype's range, or not whole numbers, can never match a uint canvas
+    for label in (1, 2.5, 300, -1, 70000):
+        vp.paint_add_canvas_label(label)
+    vp.paint_brush.set_shape(shape)
+    vp.paint_set_brush_label(3)
+
+    canvas = vp.array3D_stack[0]
+    slice_index = int(vp.image_view.currentIndex)
+    cols, rows = canvas.shape[1], canvas.shape[2]
+    original = canvas[slice_index].copy()
+    # center, the four corners and edges (footprint clipped by the slice), and a brush entirely outside
+    positions = [(4, 3), (0, 0), (cols - 1, rows - 1), (0, rows - 1), (cols - 1, 0), (-1, 3), (4, rows), (-9, -9)]
+    for size in (1, 3, 5):
+        vp.paint_brush.set_size(size)
+        for painting in (True, False):
+            for x, y in positions:
+                expected = _reference_stroke(canvas[slice_index], x, y, size // 2, shape, vp.canvas_labels,
+                                             3 if painting else 0)
+                vp._apply_brush(x, y, painting)
+                assert np.array_equal(canvas[slice_index], expected), (size, painting, x, y)
+    assert not np.array_equal(canvas[slice_index], original)
+    # painting writes through to the Image3D data
+    assert np.shares_memory(canvas, vp.image3D_obj_stack[0].data)
+
+
+def test_lut_edited_in_place_is_reapplied(make_image3d, make_viewport, volume):
+    # as DiscreteColorsWidget does: one LUT array, recoloured in place and sent out again
+    background, overlay = make_image3d(volume), make_image3d(volume)
+    for im3d in (background, overlay):
+        im3d.lut = np.zeros((256, 4), dtype=np.uint8)
+        im3d.lut[1] = (255, 0, 0, 255)
+    vp = make_viewport(ViewDir.AX, background, overlay)
+    items = {0: vp.image_view.getImageItem(), 1: vp.array2D_stack[1]}
+    for layer_index, im3d in ((0, background), (1, overlay)):
+        assert np.array_equal(items[layer_index].lut, im3d.lut)
+
+    for im3d in (background, overlay):
+        im3d.lut[1] = (0, 0, 255, 255)
+        im3d.lut[2, 3] = 128
+    vp.refresh()
+    for layer_index, im3d in ((0, background), (1, overlay)):
+        assert np.array_equal(items[layer_index].lut, im3d.lut)
+        assert items[layer_index].lut is not im3d.lut  # a snapshot, so the next in-place edit is seen as a change
+
+
+def test_deferred_slice_change_survives_refresh(make_image3d, make_viewport, volume):
+    from PyQt5.QtTest import QTest
+
+    vp = make_viewport(ViewDir.AX, make_image3d(volume))
+    emitted = []
+    vp.slice_changed_signal.connect(lambda vp_id, slice_index: emitted.append(int(slice_index)))
+    start = int(vp.image_view.currentIndex)
+    first, second = start + 1, start + 2
+    vp.image_view.setCurrentIndex(first)  # processed at once, starts the ~16 ms throttle
+    vp.image_view.setCurrentIndex(second)  # deferred until the throttle timer fires
+    assert vp._slice_change_timer.isActive()
+    assert int(vp.current_slice_index) == second
+
+    vp.refresh()  # before the timer fires
+    assert int(vp.image_view.currentIndex) == second
+    QTest.qWait(50)
+    assert int(vp.image_view.currentIndex) == second
+    assert int(vp.current_slice_index) == second
+    assert emitted == [first, second]
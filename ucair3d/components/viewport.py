@@ -1,16 +1,51 @@
+from collections import defaultdict
+from functools import lru_cache
+import importlib.util
+
 import numpy as np
 import pyqtgraph as pg
 
 from PyQt5.QtWidgets import QVBoxLayout, QWidget, QHBoxLayout, QLabel, QFrame
-from PyQt5.QtGui import QFont, QPainter, QImage, QFontMetrics, QGuiApplication, QPixmap, QColor, QCursor
-from PyQt5.QtCore import pyqtSignal, QObject, QEvent, Qt
+from PyQt5.QtGui import QFont, QPainter, QFontMetrics, QGuiApplication, QPixmap, QColor, QCursor
+from PyQt5.QtCore import pyqtSignal, QObject, QEvent, Qt, QTimer, QSignalBlocker, QElapsedTimer, QRect
 from PyQt5.QtSvg import QSvgGenerator
 
 from ..enumerations import ViewDir
 from .paint_brush import PaintBrush
 
-import cProfile, pstats, io
-from functools import wraps
+# optional: if numba is installed, let pyqtgraph JIT-compile the level scaling + LUT lookup that it runs on every slice
+# it displays (background and overlay ImageItems). numba itself is only imported by pyqtgraph when first needed.
+if importlib.util.find_spec("numba") is not None:
+    pg.setConfigOption('useNumba', True)
+
+# canvas dtypes that are painted through a boolean lookup table over all of their values (256 or 65536 entries)
+_LABEL_LUT_DTYPES = (np.dtype(np.uint8), np.dtype(np.uint16))
+
+_stamp_brush_kernel = None  # numba-compiled brush stamp (False if numba is not installed), see _get_stamp_brush_kernel
+
+
+def _get_stamp_brush_kernel():
+    """
+    Return a numba-compiled function stamp(brush_area, footprint, allowed_lut, value) that writes value into every
+    pixel of the uint8/uint16 array brush_area that is inside the brush footprint and has an allowed label value, in
+    a single pass. Compiled on first use; None if numba is not installed.
+    """
+    global _stamp_brush_kernel
+    if _stamp_brush_kernel is None:
+        if importlib.util.find_spec("numba") is None:
+            _stamp_brush_kernel = False
+        else:
+            from numba import njit
+
+            @njit(cache=True, boundscheck=False)
+            def stamp(brush_area, footprint, allowed_lut, value):
+                for i in range(brush_area.shape[0]):
+                    for j in range(brush_area.shape[1]):
+                        if footprint[i, j] and allowed_lut[brush_area[i, j]]:
+                            brush_area[i, j] = value
+
+            _stamp_brush_kernel = stamp
+    return _stamp_brush_kernel or None
 
 
 def make_green_cross_cursor(size=15, line_width=2, color=(0, 255, 0)):
@@ -21,6 +56,13 @@ def make_green_cross_cursor(size=15, line_width=2, color=(0, 255, 0)):
     :param color: (R,G,B) tuple
     :return: QCursor
     """
+    # the cursor only depends on the arguments, so every viewport / cursor manager shares one pixmap
+    return _make_cross_cursor(size, line_width, tuple(color))
+
+
+@lru_cache(maxsize=16)
+def _make_cross_cursor(size, line_width, color):
+    """Rasterize the cross cursor for make_green_cross_cursor(); color must be a (hashable) tuple."""
     pm = QPixmap(size, size)
     pm.fill(Qt.transparent)
 
@@ -47,32 +89,37 @@ class WheelEventFilter(QObject):
         self.iv = imageView
 
     def eventFilter(self, obj, event):
-        print(event.type(), QEvent.Wheel)
-        if event.type() == QEvent.Wheel:
-            # Get the current value of the time slider
-            current_value = self.iv.timeLine.value()
-            # Determine the direction of the scroll
-            delta = event.angleDelta().y()
-            # Update the slider value based on the scroll direction
-            if delta > 0:
-                new_value = current_value + 1
-            else:
-                new_value = current_value - 1
-            # Ensure the new value is within the slider's range
-            new_value = max(0, min(new_value, self.iv.timeLine.maximum()))
-            # Set the new value to the time slider
-            self.iv.timeLine.setValue(new_value)
-            return True
-        return False
+        if event.type() != QEvent.Wheel:
+            return False
+        # Get the current value of the time slider
+        current_value = self.iv.timeLine.value()
+        # Determine the direction of the scroll
+        delta = event.angleDelta().y()
+        # Update the slider value based on the scroll direction
+        if delta > 0:
+            new_value = current_value + 1
+        else:
+            new_value = current_value - 1
+        # Ensure the new value is within the slider's range
+        new_value = max(0, min(new_value, self.iv.timeLine.maximum()))
+        # Set the new value to the time slider
+        self.iv.timeLine.setValue(new_value)
+        return True
 
 
 
 
 class GlobalCtrlCursorManager(QObject):
     """
-    Tracks Ctrl key globally and applies a cursor to any registered widgets
-    while the mouse is over them. Works even when the widget doesn't have focus.
+    Tracks the Ctrl key and applies a cursor to any registered widgets while the mouse is over them. Works even when
+    the widget doesn't have focus: the Ctrl state is also read from the modifiers of the mouse moves over the targets.
+    The filter is only installed on the targets, not on the whole application, so unrelated events never reach Python.
     """
+    # the only event types eventFilter() acts on, checked first so everything else returns straight away
+    _RELEVANT_TYPES = frozenset((QEvent.Enter, QEvent.Leave, QEvent.HoverMove, QEvent.MouseMove,
+                                 QEvent.KeyPress, QEvent.KeyRelease, QEvent.FocusIn, QEvent.FocusOut,
+                                 QEvent.WindowActivate, QEvent.WindowDeactivate))
+
     def __init__(self):
         super().__init__()
         self._ctrl_down = False
@@ -80,10 +127,6 @@ class GlobalCtrlCursorManager(QObject):
         # self._cursor = Qt.CrossCursor
         self._cursor = make_green_cross_cursor(size=15, line_width=2)
 
-        app = QGuiApplication.instance()
-        if app is not None:
-            app.installEventFilter(self)  # receive global KeyPress/KeyRelease
-
     def set_cursor_shape(self, shape: Qt.CursorShape):
         self._cursor = shape
         self._apply_to_all()  # refresh immediately
@@ -111,39 +154,31 @@ class GlobalCtrlCursorManager(QObject):
         for w in self._targets:
             self._apply(w)
 
+    def _set_ctrl_down(self, ctrl_down):
+        if ctrl_down != self._ctrl_down:
+            self._ctrl_down = ctrl_down
+            self._apply_to_all()
+
     def eventFilter(self, obj, event):
         et = event.type()
-
-        # 1) Global keyboard tracking (from the app)
-        if et == QEvent.KeyPress and event.key() == Qt.Key_Control:
-            if not self._ctrl_down:
-                self._ctrl_down = True
-                self._apply_to_all()
-            return False
-        if et == QEvent.KeyRelease and event.key() == Qt.Key_Control:
-            if self._ctrl_down:
-                self._ctrl_down = False
-                self._apply_to_all()
+        if et not in self._RELEVANT_TYPES:
             return False
 
-        # 2) Pointer/focus/window changes on targets
-        if obj in self._targets:
-            if et in (QEvent.Enter, QEvent.Leave, QEvent.HoverMove,
-                      QEvent.FocusIn, QEvent.FocusOut,
-                      QEvent.WindowDeactivate, QEvent.WindowActivate):
-                self._apply(obj)
-                return False
+        # 1) keyboard tracking (targets with focus, or their focused children)
+        if et == QEvent.KeyPress or et == QEvent.KeyRelease:
+            if event.key() == Qt.Key_Control:
+                self._set_ctrl_down(et == QEvent.KeyPress)
+            return False
 
-            # If this is a QGraphicsView-like, also catch events on its viewport
-            try:
-                vp = obj.viewport()
-            except Exception:
-                vp = None
-            if vp is not None and obj is vp:  # event came from the viewport
-                if et in (QEvent.Enter, QEvent.Leave, QEvent.HoverMove):
-                    self._apply(obj)
-                    return False
+        # 2) pointer moves over a target carry the modifier state, which catches Ctrl being pressed or released
+        # while another widget had the keyboard focus
+        if et == QEvent.MouseMove or et == QEvent.HoverMove:
+            self._set_ctrl_down(bool(event.modifiers() & Qt.ControlModifier))
+            return False
 
+        # 3) pointer/focus/window changes on targets
+        self._set_ctrl_down(bool(QGuiApplication.queryKeyboardModifiers() & Qt.ControlModifier))
+        self._apply(obj)
         return False
 
 
@@ -235,7 +270,7 @@ class Viewport(QWidget):
     marker_selected_signal = pyqtSignal(object, object, object)
     markers_cleared_signal = pyqtSignal(object)
     marker_moved_signal = pyqtSignal(object, object, object)
-    slice_changed_signal = pyqtSignal(object, object)
+    slice_changed_signal = pyqtSignal(object, object)  # (vp id, slice index); throttled, see _slice_changed()
 
     def __init__(self,
                  parent,
@@ -253,6 +288,7 @@ class Viewport(QWidget):
         self.parent = parent
         self.id = vp_id
         self.view_dir = view_dir.dir  # ViewDir.AX (axial), ViewDir.COR (coronal), ViewDir.SAG (sagittal)
+        self._view_axis = self._view_axis_index()  # the Image3D (col, row, slice) axis this view steps through
         self.num_vols_allowed = num_vols  # number of images (layers) to display
 
         # parent can provide custom methods for interacting with the viewport (e.g., painting, erasing, marking,
@@ -269,6 +305,7 @@ class Viewport(QWidget):
         self.marker_mode = 'idle' # 'idle', 'adding', 'dragging', 'editing'
         self._selection_locked = False  # Prevent deselection while adding/editing markers (until Done is clicked)
         self._edit_mode = False  # Track if we're in edit mode (allows dragging)
+        self._last_markers_key = None  # what _update_markers_display() last drew (None: nothing), see there
         self.marker_moved = False
         self.selected_marker = None
         self._marker_counter = 0
@@ -287,8 +324,10 @@ class Viewport(QWidget):
         self.selected_brush = pg.mkBrush(self.selected_marker_color)
         self.temp_pen = pg.mkPen(self.temp_marker_outline_color, width=1)
         self.temp_brush = pg.mkBrush(self.temp_marker_color)
-        # dictionary to store points for each slice
-        self.slice_markers = {}
+        # dictionary to store points for each slice (missing slices start out as an empty list)
+        self.slice_markers = defaultdict(list)
+        # marker id -> (slice index, marker), kept in step with slice_markers by add_marker() and marker_delete*()
+        self._marker_index = {}
 
         # convenience reference to the background image item
         self.background_image_index = None
@@ -298,12 +337,35 @@ class Viewport(QWidget):
         self.canvas_labels = []         # the labels that are affected by painting
         self.marker_layer_index = None   # the layer that points are currently being added to
         self.current_slice_index = 0
+        self._last_rendered_slice = -1  # slice the overlays were last rendered for (-1: must re-render)
 
         # interactive painting
         self.is_painting = False
         self.paint_brush = PaintBrush(size=5)
+        # footprint of the brush as a boolean mask, rebuilt only when the brush size or shape changes
+        self._brush_mask = None
+        self._brush_mask_key = None
+        # canvas_labels as a lookup table over uint8/uint16 values, rebuilt only when canvas_labels or the canvas dtype
+        # changes
+        self._canvas_label_lut = None
+        self._canvas_label_lut_key = None
+        # canvas_labels as an array, for the np.isin fallback used by other dtypes
+        self._canvas_labels_arr = None
+        self._canvas_labels_arr_key = None
 
         self.display_convention = "RAS"  # default to RAS (radiological convention) # TODO, make this an input opt.
+        # the coordinate conversions for the current background image, as precomputed maps. Set by _rebuild_axis_maps()
+        # during refresh()
+        self._plot_to_image_axis_map = None  # plot (x, y, slice) -> Image3D (col, row, slice), see _rebuild_axis_maps()
+        self._image_to_plot_axis_map = None  # Image3D (col, row, slice) -> plot (x, y, slice), see _rebuild_axis_maps()
+        self._plotxy_affine = None  # (sx, tx, sy, ty) for plotdatacr_to_plotxy(), see _rebuild_axis_maps()
+        self._plotdatacrs_affine = None  # (sx, tx, sy, ty, sz, tz) for plotxyz_to_plotdatacrs(), likewise
+        self._image_to_plotdata_axis_map = None  # signed axis map for imagecrs_to_plotdatacrs(), likewise
+        self._plotdata_to_image_axis_map = None  # signed axis map for plotdatacrs_to_imagecrs(), likewise
+        self._crs_identity = False  # True if both of those maps are the identity (e.g. an RAS image viewed axially)
+        # (origin, col axis, row axis, slice axis) for _voxel_to_world(), likewise. None also when the background image
+        # has no voxel_to_world(), so the mouse and slice handlers test this instead of probing the image every event
+        self._voxel_to_world_affine = None
 
         # initialize widgets and their slots -------------------------------------
         # the main layout for this widget ----------
@@ -342,6 +404,8 @@ class Viewport(QWidget):
         self.coordinates_label.setFixedWidth(width)
         self.coordinates_label.setFixedHeight(line_height * 2)  # Two lines
         # initialize with blanks
+        self._last_coords_text = None  # text last shown by _set_coords_label()
+        self._last_coords_key = None  # arguments (and display convention) of the last _set_coords_label() call
         self._set_coords_label(None, None, 0, None)
         coords_frame.layout().addWidget(self.coordinates_label)
 
@@ -356,6 +420,8 @@ class Viewport(QWidget):
 
         # Ensure the ImageView can receive key events
         self.image_view.setFocusPolicy(Qt.StrongFocus)
+        # the graphics scene of the ImageView's ViewBox, whose mouse and wheel events are customized below
+        self.graphics_scene = self.image_view.getView().scene()
 
         # Create or reuse a singleton manager (store on parent/app as convenient)
         self._ctrl_mgr = getattr(QGuiApplication.instance(), "_global_ctrl_mgr", None)
@@ -368,7 +434,7 @@ class Viewport(QWidget):
 
         # Register the underlying GraphicsView and its viewport so hover works even if focus doesn't
         try:
-            gv_list = self.image_view.getView().scene().views()
+            gv_list = self.graphics_scene.views()
             if gv_list:
                 gv = gv_list[0]
                 gv.setFocusPolicy(Qt.StrongFocus)
@@ -386,10 +452,9 @@ class Viewport(QWidget):
         font.setPointSize(8)  # Set to desired font size
         axis.setTickFont(font)
 
-        self.original_mouse_press = self.image_view.getView().scene().mousePressEvent
-        self.original_mouse_release = self.image_view.getView().scene().mouseReleaseEvent
-        self.original_mouse_move = self.image_view.getView().scene().mouseMoveEvent
-        self.image_view.getView().scene().mouseMoveEvent = self._mouse_move
+        self.original_mouse_press = self.graphics_scene.mousePressEvent
+        self.original_mouse_release = self.graphics_scene.mouseReleaseEvent
+        self.original_mouse_move = self.graphics_scene.mouseMoveEvent
 
         self.image_view.getHistogramWidget().setVisible(False)
         self.image_view.ui.menuBtn.setVisible(False)  # hide these for now
@@ -403,25 +468,26 @@ class Viewport(QWidget):
         self.sag_line_color = 'y'
         self.cor_line_color = '#447CF9'
         self.slice_line_width = 0.5
-        self.horizontal_line = pg.InfiniteLine(angle=0, pen=pg.mkPen('r', width=self.slice_line_width), movable=False)
-        self.vertical_line = pg.InfiniteLine(angle=90, pen=pg.mkPen('r', width=self.slice_line_width), movable=False)
-        self.horizontal_line_idx = 0
-        self.vertical_line_idx = 0
+        # each guide takes the color of the view whose slice it shows; pick them first so each line gets one pen
         if self.view_dir == ViewDir.AX.dir:
-            self.horizontal_line.setPen(pg.mkPen(self.cor_line_color, width=self.slice_line_width))
-            self.vertical_line.setPen(pg.mkPen(self.sag_line_color, width=self.slice_line_width))
+            horizontal_color, vertical_color = self.cor_line_color, self.sag_line_color
         elif self.view_dir == ViewDir.COR.dir:
-            self.horizontal_line.setPen(pg.mkPen(self.axial_line_color, width=self.slice_line_width))
-            self.vertical_line.setPen(pg.mkPen(self.sag_line_color, width=self.slice_line_width))
+            horizontal_color, vertical_color = self.axial_line_color, self.sag_line_color
         else:  # "SAG"
-            self.horizontal_line.setPen(pg.mkPen(self.axial_line_color, width=self.slice_line_width))
-            self.vertical_line.setPen(pg.mkPen(self.cor_line_color, width=self.slice_line_width))
+            horizontal_color, vertical_color = self.axial_line_color, self.cor_line_color
+        self.horizontal_line = pg.InfiniteLine(angle=0, pen=pg.mkPen(horizontal_color, width=self.slice_line_width),
+                                               movable=False)
+        self.vertical_line = pg.InfiniteLine(angle=90, pen=pg.mkPen(vertical_color, width=self.slice_line_width),
+                                             movable=False)
+        self.horizontal_line_idx = 0
+        self.vertical_line_idx = 0
         self.image_view.addItem(self.horizontal_line, ignoreBounds=True)
         self.image_view.addItem(self.vertical_line, ignoreBounds=True)
         self.show_slice_guides = True  # default to showing slice guides
         # but don't show them until an image is displayed
         self.horizontal_line.setVisible(False)
         self.vertical_line.setVisible(False)
+        self._last_crosshairs_key = None  # (visible, horizontal idx, vertical idx) last applied by update_crosshairs()
         # ensure that these lines are always on top
         self.horizontal_line.setZValue(10)
         self.vertical_line.setZValue(10)
@@ -438,7 +504,10 @@ class Viewport(QWidget):
         NIfTI image 3D array --> as closest canonical --> Image3D object data
         Image3D object data --> reorient to axial, coronal, sagittal --> array3D -->"""
         self.image3D_obj_stack = [None] * self.num_vols_allowed  # Image3D objects
+        self._active_indices = []  # stack positions (ascending) of image3D_obj_stack that hold an Image3D object
         self.array3D_stack = [None] * self.num_vols_allowed  # image data 3D arrays
+        # display aspect ratio (pixel width / pixel height in this view) of each image, set when the layer is added
+        self._aspect_ratio_stack = [None] * self.num_vols_allowed
         # image data 2D arrays (slices) - one less than total number of images allowed because these are overlays
         # and 3D background image is always displayed first in the image_view
         self.array2D_stack = [pg.ImageItem() for _ in range(self.num_vols_allowed)]
@@ -447,6 +516,9 @@ class Viewport(QWidget):
         # add a canvas mask for painting
         self.imageItem2D_canvas = pg.ImageItem()
         self.image_view.view.addItem(self.imageItem2D_canvas)
+        # display state (levels, opacity, lut) last applied to each ImageItem, keyed by id(image_item). Lets refresh()
+        # and _update_overlay_slice() skip pyqtgraph setters (and the repaints they trigger) when nothing changed.
+        self._applied_state = {}
 
         # this is the plot item for creating points. Customized to capture mouse press and mouse click events
         self.scatter = CustomScatterPlotItem()
@@ -456,22 +528,35 @@ class Viewport(QWidget):
 
 
         # connect the mouse click event to the graphics scene
-        # optionally, profile this slot by wrapping it in the profiler
+        # optionally, profile this slot by wrapping it in the profiler. Only in debug mode: cProfile on every press is
+        # far too expensive for normal use, so otherwise the scene calls _mouse_press directly
         if self.parent.debug_mode:
-            self.image_view.getView().scene().mousePressEvent = self._mouse_press_wrapper
+            self.graphics_scene.mousePressEvent = self._mouse_press_wrapper
         else:
-            self.image_view.getView().scene().mousePressEvent = self._mouse_press
+            self.graphics_scene.mousePressEvent = self._mouse_press
 
         # connect the mouse release event to the graphics scene
-        self.image_view.getView().scene().mouseReleaseEvent = self._mouse_release
+        self.graphics_scene.mouseReleaseEvent = self._mouse_release
 
-        # connect the mouse move event to the graphics scene
-        self.image_view.getView().scene().mouseMoveEvent = self._mouse_move
+        # connect the mouse move event to the graphics scene. Mouse tracking (move events without a button pressed) is
+        # enabled on the graphics view and its viewport by the cursor manager's add_target() above
+        self.graphics_scene.mouseMoveEvent = self._mouse_move
+        # throttles the coordinate label updates of _mouse_move() to ~60 Hz
+        self._drag_hz_timer = QElapsedTimer()
+        self._drag_hz_timer.start()
+        self._drag_throttle_ms = 16  # ~60 Hz
 
         # when the timeLine position changes, update the overlays
         self.image_view.timeLine.sigPositionChanged.connect(self._slice_changed)
+        # slice changes are processed at most once per ~16 ms (60 Hz), like the mouse move throttling. While the timer
+        # runs, further changes (e.g. fast wheel scrolling) are coalesced and only the latest slice is processed when it
+        # fires.
+        self._pending_slice_change = False
+        self._slice_change_timer = QTimer(self)
+        self._slice_change_timer.setSingleShot(True)
+        self._slice_change_timer.setInterval(16)
+        self._slice_change_timer.timeout.connect(self._slice_change_timeout)
 
-        self.graphics_scene = self.image_view.getView().scene()
         self.graphics_scene.wheelEvent = self._wheel_event
 
         # cache last mouse status/position (for coodinates display)
@@ -480,6 +565,20 @@ class Viewport(QWidget):
         self._last_plot_y = None
         self._last_valid_im3d_crs = None  # tuple[int,int,int] = (col,row,slc)
         self._last_valid_world = None  # tuple[float,float,float]
+        # reusable voxel index buffer for voxel -> world conversions on mouse moves and slice changes
+        self._vox_buf = np.empty(3, dtype=np.int32)
+
+    @property
+    def background_image_index(self):
+        """Stack index of the image displayed as the 3D background image, or None if the stack is empty."""
+        return self._background_image_index
+
+    @background_image_index.setter
+    def background_image_index(self, value):
+        # keep a direct reference to the background Image3D object, so the hot paths (coordinate conversions, mouse
+        # moves) don't have to index the stack and check for None on every call
+        self._background_image_index = value
+        self._active_image3D = self.image3D_obj_stack[value] if value is not None else None
 
     #  -----------------------------------------------------------------------------------------------------------------
     #  "Public" methods API --------------------------------------------------------------------------------------------
@@ -499,6 +598,7 @@ class Viewport(QWidget):
             return
 
         self.image3D_obj_stack[stack_position] = im3Dobj  # not a deep copy, reference to the image3D object
+        self._active_indices = [ind for ind, im_obj in enumerate(self.image3D_obj_stack) if im_obj is not None]
         self.active_image_index = stack_position
         # PyQtGraph expects the first dimension of the array to represent time or frames in a sequence, but when used
         # for static 3D volumes, it expects the first dimension to represent slices (essentially the "depth" dimension
@@ -512,7 +612,7 @@ class Viewport(QWidget):
                 # DEBUG:
                 # print(f"3D array shape: {self.array3D_stack[stack_position].shape}")
 
-                ratio = im3Dobj.dy / im3Dobj.dx
+                self._aspect_ratio_stack[stack_position] = im3Dobj.dx / im3Dobj.dy
             elif self.view_dir == ViewDir.COR.dir:
                 # transpose im3Dobj data (x, y, z) to (x, z, y) for coronal view, then to (y, x, z) for pyqtgraph
                 # then save the transposed array  # FIXME: should z be flipped? like x, -z, y?
@@ -521,7 +621,7 @@ class Viewport(QWidget):
                 # DEBUG:
                 # print(f"3D array shape: {self.array3D_stack[stack_position].shape}")
 
-                ratio = im3Dobj.dz / im3Dobj.dx
+                self._aspect_ratio_stack[stack_position] = im3Dobj.dx / im3Dobj.dz
             else:  # "SAG"
                 # transpose im3Dobj data (x, y, z) to (y, z, x) for sagittal view, then (x, y, z) for pyqtgraph
                 # then save the transposed array
@@ -530,6 +630,8 @@ class Viewport(QWidget):
                 # DEBUG:
                 # print(f"3D array shape: {self.array3D_stack[stack_position].shape}")
 
+                self._aspect_ratio_stack[stack_position] = im3Dobj.dy / im3Dobj.dz
+
             # start at middle slice
             self.current_slice_index = (int(self.array3D_stack[stack_position].shape[0] // 2))
 
@@ -537,7 +639,8 @@ class Viewport(QWidget):
             self.slice_changed_signal.emit(self.id, self.current_slice_index)
         else:
             self.array3D_stack[stack_position] = None
-            self.array2D_stack[stack_position].setImage(np.zeros((1, 1)))  # clear the image
+            self._aspect_ratio_stack[stack_position] = None
+            self.array2D_stack[stack_position].clear()  # clear the image (keeps the item's levels and LUT)
 
             # FIXME: correct?
             self.background_image_index = 0
@@ -550,7 +653,7 @@ class Viewport(QWidget):
     def goto_slice(self, slice_index):
         """
         Display the specified slice in the image view. Set self.current_slice_index to the specified slice index, then
-        calls refresh.
+        moves the background image to it and updates the overlays and markers (see _update_overlays()).
 
         :param slice_index:
         :return:
@@ -562,8 +665,11 @@ class Viewport(QWidget):
                 img_shape = array3D.shape
                 if 0 <= slice_index < img_shape[0]:
                     self.current_slice_index = slice_index
-                    self.refresh_preserve_extent()
-                    # self.refresh()
+                    # only the slice changes: no need to re-set the 3D image (and have pyqtgraph rescan it for its
+                    # levels) or restore the view extent, as refresh_preserve_extent() would
+                    with QSignalBlocker(self.image_view.timeLine):
+                        self.image_view.setCurrentIndex(int(slice_index))
+                    self._update_overlays()
 
     def hide_layer(self, stack_position):
         if self.image3D_obj_stack[stack_position] is None:
@@ -581,6 +687,8 @@ class Viewport(QWidget):
             self.image_view.getImageItem().setVisible(True)
         else:
             self.array2D_stack[stack_position].setVisible(True)
+            # hidden overlays are not kept up to date (see _update_overlay_slice), so load the current slice now
+            self._update_overlay_slice(stack_position, use_blend_opacity=getattr(self, '_use_blend_opacity', False))
         self.scatter.setVisible(True)
 
     def move_layer_up(self):
@@ -603,12 +711,14 @@ class Viewport(QWidget):
         :param plot_data_row: int
         :return: plot_x, plot_y [int, int]
         """
-        xy = None
+        affine = self._plotxy_affine
+        if affine is not None:
+            sx, tx, sy, ty = affine
+            return sx * plot_data_col + tx, sy * plot_data_row + ty
 
-        if self.background_image_index is None:
-            return xy
+        xy = None
 
-        image3D_obj = self.image3D_obj_stack[self.background_image_index]
+        image3D_obj = self._active_image3D  # None if there is no background image
 
         if image3D_obj is not None:
             if self.display_convention == 'RAS':
@@ -651,27 +761,29 @@ class Viewport(QWidget):
                     else:  # 'I'
                         plot_y = image3D_obj.num_slices - 1 - plot_data_row
 
-                xy = np.array([plot_x, plot_y])
+                xy = (plot_x, plot_y)
 
         return xy
 
     def plotxyz_to_plotdatacrs(self, plot_x, plot_y, plot_z):
         """
         Convert the x, y, and z (slice index) plot coordinates to the col, row, slice coordinates of the underlying
-        3D image data.
+        3D image data. Once refresh() has run, the coordinates may also be NumPy arrays (of points), which are converted
+        in one vectorized step.
         :param plot_x:
         :param plot_y:
         :param plot_z:
         :return:
         """
+        affine = self._plotdatacrs_affine
+        if affine is not None:
+            sx, tx, sy, ty, sz, tz = affine
+            return sx * plot_x + tx, sy * plot_y + ty, sz * plot_z + tz
 
         crs = None
 
-        if self.background_image_index is None:
-            return crs
-
         # the Image3D object that the plot data originates from. Only needed here for info about axes directions
-        image3D_obj = self.image3D_obj_stack[self.background_image_index]
+        image3D_obj = self._active_image3D
 
         if image3D_obj is not None:
             if self.display_convention == 'RAS':
@@ -732,7 +844,7 @@ class Viewport(QWidget):
                     else:  # 'I'
                         plot_data_row = image3D_obj.num_slices - 1 - plot_y
 
-                crs = np.array([plot_data_col, plot_data_row, plot_data_slice])
+                crs = (plot_data_col, plot_data_row, plot_data_slice)
 
         return crs
 
@@ -740,20 +852,25 @@ class Viewport(QWidget):
         """
         Taking into account the current display convention (RAS, etc.), find the plot data col,row,slice (crs)
         coordinates from the image3D object data crs coordinates. Note that the plot data may be transposed from the
-        image3D to match the orientation of the viewport.
+        image3D to match the orientation of the viewport. Once refresh() has run, the coordinates may also be NumPy
+        arrays (e.g. of all markers), which are converted in one vectorized step.
 
         :param voxel_col:
         :param voxel_row:
         :param voxel_slice:
-        :return: crs np.array([plot_data_col, plot_data_row, plot_data_slice]) or None
+        :return: crs (plot_data_col, plot_data_row, plot_data_slice) or None
         """
+        if self._crs_identity:
+            return voxel_col, voxel_row, voxel_slice
+        axis_map = self._image_to_plotdata_axis_map
+        if axis_map is not None:
+            crs = (voxel_col, voxel_row, voxel_slice)
+            (src_c, sign_c, offset_c), (src_r, sign_r, offset_r), (src_s, sign_s, offset_s) = axis_map
+            return sign_c * crs[src_c] + offset_c, sign_r * crs[src_r] + offset_r, sign_s * crs[src_s] + offset_s
 
         crs = None
 
-        if self.background_image_index is None:
-            return crs
-
-        image3D_obj = self.image3D_obj_stack[self.background_image_index]
+        image3D_obj = self._active_image3D  # None if there is no background image
 
         if image3D_obj is not None:
             if self.display_convention == 'RAS':
@@ -814,7 +931,7 @@ class Viewport(QWidget):
                     else:  # 'I'
                         plot_data_row = image3D_obj.num_slices - 1 - voxel_slice
 
-                crs = np.array([plot_data_col, plot_data_row, plot_data_slice])
+                crs = (plot_data_col, plot_data_row, plot_data_slice)
 
         return crs
 
@@ -822,20 +939,25 @@ class Viewport(QWidget):
         """
         Taking into account the current display convention (RAS, etc.), finds col,row,slice (crs) coordinates of Image3D
         object from the plot data crs coordinates. Note that plot crs are in the coordinate space of the plot data,
-        which may be transposed from the original Image3D to match the orientation of the viewport.
+        which may be transposed from the original Image3D to match the orientation of the viewport. Once refresh() has
+        run, the coordinates may also be NumPy arrays, which are converted in one vectorized step.
 
         :param plot_data_col:
         :param plot_data_row:
         :param plot_data_slice:
-        :return: crs: np.array([voxel_col, voxel_row, voxel_slice])
+        :return: crs: (voxel_col, voxel_row, voxel_slice) or None
         """
+        if self._crs_identity:
+            return plot_data_col, plot_data_row, plot_data_slice
+        axis_map = self._plotdata_to_image_axis_map
+        if axis_map is not None:
+            crs = (plot_data_col, plot_data_row, plot_data_slice)
+            (src_c, sign_c, offset_c), (src_r, sign_r, offset_r), (src_s, sign_s, offset_s) = axis_map
+            return sign_c * crs[src_c] + offset_c, sign_r * crs[src_r] + offset_r, sign_s * crs[src_s] + offset_s
 
         crs = None
 
-        if self.background_image_index is None:
-            return crs
-
-        image3D_obj = self.image3D_obj_stack[self.background_image_index]
+        image3D_obj = self._active_image3D  # None if there is no background image
 
         if image3D_obj is not None:
             if self.display_convention == 'RAS':
@@ -894,41 +1016,39 @@ class Viewport(QWidget):
                     else:  # 'I'
                         voxel_row = image3D_obj.num_slices - 1 - plot_data_slice
 
-                crs = np.array([voxel_col, voxel_row, voxel_slice])
+                crs = (voxel_col, voxel_row, voxel_slice)
 
         return crs
 
     def update_crosshairs(self):
-        if self.background_image_index is None:
-            # no image to display, so hide slice guides, even if visibility is set to True
-            self.horizontal_line.setVisible(False)
-            self.vertical_line.setVisible(False)
-        else:
-            self.horizontal_line.setVisible(self.show_slice_guides)
-            self.vertical_line.setVisible(self.show_slice_guides)
-            if self.show_slice_guides:
-                self.horizontal_line.setPos(self.horizontal_line_idx)
-                self.vertical_line.setPos(self.vertical_line_idx)
+        # no image to display: hide slice guides, even if visibility is set to True
+        visible = self.background_image_index is not None and self.show_slice_guides
+        # the host calls this whenever another viewport changes slice, which mostly leaves these lines as they are
+        key = (visible, self.horizontal_line_idx, self.vertical_line_idx) if visible else (False,)
+        if key == self._last_crosshairs_key:
+            return
+        self._last_crosshairs_key = key
+
+        self.horizontal_line.setVisible(visible)
+        self.vertical_line.setVisible(visible)
+        if visible:
+            self.horizontal_line.setPos(self.horizontal_line_idx)
+            self.vertical_line.setPos(self.vertical_line_idx)
 
     def export_svg(self, filename='output.svg'):
         """Saves a PyQtGraph ImageView (base + overlay) as an SVG file."""
 
-        # Step 1: Render the ImageView to a QImage
         size = self.image_view.size()
-        img = QImage(size.width(), size.height(), QImage.Format_ARGB32)
-        painter = QPainter(img)
-        self.image_view.render(painter)  # Capture ImageView with overlays
-        painter.end()
-
-        # Step 2: Convert the QImage to an SVG
         svg_generator = QSvgGenerator()
         svg_generator.setFileName(filename)
         svg_generator.setSize(size)
-        svg_generator.setViewBox(0, 0, size.width(), size.height())
+        svg_generator.setViewBox(QRect(0, 0, size.width(), size.height()))
 
-        # Step 3: Draw the QImage onto the SVG
+        # Render the ImageView (with overlays) straight into the SVG. The image layers are still embedded as bitmaps,
+        # but markers, slice guides and text are written as vector elements, and no intermediate full-size QImage is
+        # needed
         painter = QPainter(svg_generator)
-        painter.drawImage(0, 0, img)
+        self.image_view.render(painter)
         painter.end()
         print(f"Saved: {filename}")
 
@@ -971,9 +1091,6 @@ class Viewport(QWidget):
             # DEBUG:
             # print(f"Image3D coordinates: col: {image_crs[0]}, row: {image_crs[1]}, slice: {image_crs[2]}")
 
-            # do we have any markers on this slice yet?
-            if plot_data_crs[2] not in self.slice_markers:  # slice_markers organized by slice index of the 3D plot data
-                self.slice_markers[plot_data_crs[2]] = []
             if new_id is not None:
                 # use the provided id
                 marker_id = new_id
@@ -992,10 +1109,60 @@ class Viewport(QWidget):
                 'image_slice': image_slice,  # voxel index in the Image3D object data
                 'is_selected': False  # FIXME: might not be necessary if only one marker can be selected at a time?
             }
+            # slice_markers organized by slice index of the 3D plot data
             self.slice_markers[plot_data_crs[2]].append(new_marker)
+            self._marker_index[marker_id] = (plot_data_crs[2], new_marker)
 
         return new_marker
 
+    def add_markers(self, image_cols, image_rows, image_slices, image_index, new_ids=None):
+        """
+        Add many markers at once (e.g. when importing landmarks), as add_marker() would one by one. The coordinates are
+        converted and bounds-checked in one vectorized step. As with add_marker(), the markers are not plotted until
+        _update_markers_display() is called.
+
+        :param image_cols: sequence of int
+        :param image_rows: sequence of int
+        :param image_slices: sequence of int
+        :param image_index: int (index of the image in the stack)
+        :param new_ids: sequence of str (optional, one id per marker, see add_marker())
+        :return: list of new markers (dict), with None for each marker that falls outside the image
+        """
+        image_crs = np.array([image_cols, image_rows, image_slices], dtype=int).reshape(3, -1)
+        new_markers = [None] * image_crs.shape[1]
+        if not new_markers:
+            return new_markers
+
+        # shape is in the form (slices, cols, rows)
+        plot_data_shape = self.array3D_stack[image_index].shape
+        plot_data_crs = self.imagecrs_to_plotdatacrs(image_crs[0], image_crs[1], image_crs[2])
+        if plot_data_crs is None:
+            return new_markers
+        plot_data_crs = np.stack(np.broadcast_arrays(*plot_data_crs), axis=1)  # (n, 3)
+        plot_data_size = np.array((plot_data_shape[1], plot_data_shape[2], plot_data_shape[0]))
+        inside = ((plot_data_crs >= 0) & (plot_data_crs < plot_data_size)).all(axis=1)
+
+        image_crs = image_crs.T.tolist()
+        plot_data_slices = plot_data_crs[:, 2].tolist()
+        for i in np.flatnonzero(inside).tolist():
+            if new_ids is not None:
+                marker_id = new_ids[i]
+            else:
+                self._marker_counter += 1
+                marker_id = f"MK_{self.id}_{self._marker_counter}"
+            new_marker = {
+                'id': marker_id,
+                'image_col': image_crs[i][0],
+                'image_row': image_crs[i][1],
+                'image_slice': image_crs[i][2],
+                'is_selected': False
+            }
+            self.slice_markers[plot_data_slices[i]].append(new_marker)
+            self._marker_index[marker_id] = (plot_data_slices[i], new_marker)
+            new_markers[i] = new_marker
+
+        return new_markers
+
     def marker_select(self, mkr, notify):
         """
         Set specified point as selected. Deselect any other point that was previously selected. Update the
@@ -1019,7 +1186,7 @@ class Viewport(QWidget):
                 return  # FIXME: how to handle?
 
             self.current_slice_index = plot_data_crs[2]
-            self.goto_slice(plot_data_crs[2])  # calls refresh_preserve_extent()
+            self.goto_slice(plot_data_crs[2])  # also redraws the markers
             # self.refresh_preserve_extent()
             if notify:
                 self.marker_selected_signal.emit(mkr, self.id, self.view_dir)
@@ -1035,26 +1202,28 @@ class Viewport(QWidget):
         # if self.parent.debug_mode:  # print debug messages
         #     print(f"marker_find_by_id() with id {point_id} for viewport {self.id}")
 
-        for slice_idx, points in self.slice_markers.items():
-            for pt in points:
-                if pt['id'] == point_id:
-                    return pt
-        return None
+        entry = self._marker_index.get(point_id)
+        return entry[1] if entry is not None else None
 
     def marker_delete(self, marker_id):
 
         # if self.parent.debug_mode:  # print debug messages
         #     print(f"marker_select() with marker {marker_id} for viewport {self.id}")
 
-        for slice_idx, slice_markers in self.slice_markers.items():
-            for mk in slice_markers:
-                if mk['id'] == marker_id:
-                    slice_markers.remove(mk)
-                    self._update_markers_display()
-                    return
+        entry = self._marker_index.pop(marker_id, None)
+        if entry is None:
+            return
+        slice_idx, marker = entry
+        slice_markers = self.slice_markers[slice_idx]
+        for i, mk in enumerate(slice_markers):
+            if mk is marker:
+                del slice_markers[i]
+                break
+        self._update_markers_display()
 
     def marker_delete_all(self):
-        self.slice_markers = {}
+        self.slice_markers = defaultdict(list)
+        self._marker_index = {}
         self._update_markers_display()
 
     def marker_sync_counter(self):
@@ -1229,104 +1398,71 @@ class Viewport(QWidget):
         # if self.parent.debug_mode:  # print debug messages
         #     print(f"refresh() for viewport {self.id}")
 
-        self.image_view.clear()
+        # suppress intermediate repaints while the layers are (re)applied; everything is repainted once at the end
+        self.image_view.setUpdatesEnabled(False)
+        try:
+            # the image stack may have empty slots, so we need to find the first non-empty image to display
+            found_bottom_image = False
+            self.background_image_index = None
+
+            # setImage() and setCurrentIndex() move the timeLine - block its signals so _slice_changed() isn't triggered
+            with QSignalBlocker(self.image_view.timeLine):
+                for ind in self._active_indices:
+                    im_obj = self.image3D_obj_stack[ind]
+                    if not found_bottom_image:
+                        # this is the bottom image in the stack and will be set as the 3D background image item in
+                        # the image view
+                        im_data = self.array3D_stack[ind]  # the (optionally transposed) 3D array
+
+                        main_image = self.image_view.getImageItem()
+                        if self.image_view.image is not im_data:
+                            self._set_volume(im_data, im_obj)
+                        # else: already the displayed volume, setCurrentIndex() below re-renders the slice. Either way,
+                        # reset the extent to the (new) background
+                        self.image_view.autoRange()
+                        view_box = self.image_view.view  # the ViewBox holding main_image, without getViewBox()'s lookup
+                        # FIXME: set aspect ratio based on base image? What about overlay?
+                        view_box.setAspectLocked(True, ratio=self._aspect_ratio_stack[ind])
+
+                        # FIXME: testing
+                        # self.scatter_items = [pg.ScatterPlotItem() for _ in range(im_data.shape[0])]
+                        # for scatter in self.scatter_items:
+                        #     self.image_view.getView().addItem(scatter)
+
+                        self._apply_display_settings(main_image, im_obj, use_blend_opacity)
+
+                        # FIXME: correct? # radiological convention = RAS+ notation
+                        #  (where patient is HFS??, ie, patient right is on the left of the screen, and patient
+                        #  posterior at the bottom of the screen?)
+                        # x increases from screen right to left if RAS+ notation (and patient is HFS?). Set it both
+                        # ways so an 'L' background replacing an 'R' one does not inherit the inversion. The view box
+                        # itself returns early when the aspect/inversion state is unchanged
+                        view_box.invertY(False)
+                        view_box.invertX(im_obj.x_dir == 'R')
+
+                        # self.is_user_histogram_interaction = True
+                        self.background_image_index = ind
+                        found_bottom_image = True
+                    else:
+                        # this is an overlay image, so we need to get a slice of it and set it as an overlay
+                        # uses self.current_slice_index
+                        self._update_overlay_slice(ind, use_blend_opacity=use_blend_opacity)
 
-        # the image stack may have empty slots, so we need to find the first non-empty image to display
-        found_bottom_image = False
-        self.background_image_index = None
+                    # set the current slice index to the first slice of the background image
+                    self.image_view.setCurrentIndex(self.current_slice_index)
 
-        for ind, im_obj in enumerate(self.image3D_obj_stack):
-            if im_obj is None:
-                continue
-            else:
-                if not found_bottom_image:
-                    # this is the bottom image in the stack and will be set as the 3D background image item in the
-                    # image view
-                    im_data = self.array3D_stack[ind]  # the (optionally transposed) 3D array
-
-                    # if the Image3D object does not have display-related information, then set some defaults
-                    disp_min = getattr(im_obj, "display_min", im_obj.data_min)
-                    disp_max = getattr(im_obj, "display_max", im_obj.data_max)
-                    # Use blend_opacity if flag is set and attribute exists, otherwise use opacity
-                    if use_blend_opacity and hasattr(im_obj, "blend_opacity"):
-                        opacity = getattr(im_obj, "blend_opacity", 1.0)
-                    else:
-                        opacity = getattr(im_obj, "opacity", 1.0)
-                    lut = getattr(im_obj, "lut", None)
-
-                    # disconnect the slot to prevent this from happening
-                    try:
-                        # disconnect the slot before making changes
-                        self.image_view.timeLine.sigPositionChanged.disconnect(self._slice_changed)
-                    except TypeError:
-                        # if the slot was not connected, ignore the error
-                        pass
-                    self.image_view.setImage(im_data)
-                    # FIXME: set aspect ratio based on base image? What about overlay?
-                    if self.view_dir == ViewDir.AX.dir:
-                        self.image_view.view.setAspectLocked(True, ratio=im_obj.dx / im_obj.dy)
-                    elif self.view_dir == ViewDir.COR.dir:
-                        self.image_view.view.setAspectLocked(True, ratio=im_obj.dx / im_obj.dz)
-                    else:  # "SAG"
-                        self.image_view.view.setAspectLocked(True, ratio=im_obj.dy / im_obj.dz)
-
-                    self.image_view.timeLine.sigPositionChanged.connect(self._slice_changed)
-
-                    # FIXME: testing
-                    # self.scatter_items = [pg.ScatterPlotItem() for _ in range(im_data.shape[0])]
-                    # for scatter in self.scatter_items:
-                    #     self.image_view.getView().addItem(scatter)
-
-                    main_image = self.image_view.getImageItem()
-
-                    # Set the levels to prevent LUT rescaling based on the slice content
-                    main_image.setLevels([disp_min, disp_max])
-                    # apply the opacity of the Image3D object to the ImageItem
-                    main_image.setOpacity(opacity)
-                    if isinstance(lut, np.ndarray):
-                        main_image.setLookupTable(lut)  # LUT path (discrete or continuous)
-                    else:
-                        # optional fallback if you ever store names for continuous:
-                        if getattr(im_obj, "colormap_kind", None) == "continuous" and isinstance(im_obj.colormap_source,
-                                                                                                 str):
-                            lut = getattr(im_obj, "lut", None)
-                            if isinstance(lut, np.ndarray):
-                                main_image.setLookupTable(lut)  # works for discrete & continuous
-                            else:
-                                name = getattr(im_obj, "colormap_source", None)
-                                if isinstance(name, str):
-                                    # optional: try name only if you know pyqtgraph has it
-                                    main_image.setColorMap(name)
-
-                    # FIXME: correct? # radiological convention = RAS+ notation
-                    #  (where patient is HFS??, ie, patient right is on the left of the screen, and patient posterior
-                    #  at the bottom of the screen?)
-                    self.image_view.getImageItem().getViewBox().invertY(False)
-                    if im_obj.x_dir == 'R':
-                        # x increases from screen right to left if RAS+ notation (and patient is HFS?)
-                        self.image_view.getImageItem().getViewBox().invertX(True)
-
-                    # self.is_user_histogram_interaction = True
-                    self.background_image_index = ind
-                    found_bottom_image = True
-                else:
-                    # this is an overlay image, so we need to get a slice of it and set it as an overlay
-                    self._update_overlay_slice(ind, use_blend_opacity=use_blend_opacity)  # uses self.current_slice_index
+            if self.background_image_index is None:
+                self.image_view.clear()
 
-                # set the current slice index to the first slice of the background image
-                try:
-                    # disconnect the slot before making changes
-                    self.image_view.timeLine.sigPositionChanged.disconnect(self._slice_changed)
-                except TypeError:
-                    # if the slot was not connected, ignore the error
-                    pass
-                self.image_view.setCurrentIndex(self.current_slice_index)
-                self.image_view.timeLine.sigPositionChanged.connect(self._slice_changed)
+            self._rebuild_axis_maps()
+            self._last_rendered_slice = int(self.current_slice_index) if self.background_image_index is not None else -1
 
-        self._update_markers_display()
+            self._update_markers_display()
 
-        # update the crosshairs
-        self.update_crosshairs()
+            # update the crosshairs
+            self.update_crosshairs()
+        finally:
+            self.image_view.setUpdatesEnabled(True)
 
         self.image_view.show()
 
@@ -1334,6 +1470,112 @@ class Viewport(QWidget):
     #  "Private" methods -----------------------------------------------------------------------------------------------
     #  -----------------------------------------------------------------------------------------------------------------
 
+    def _rebuild_axis_maps(self):
+        """
+        Cache what the coordinate conversion methods need to know about the current background image. Called from
+        refresh(), after the background image index has been (re)established.
+        """
+        self._plot_to_image_axis_map = None
+        self._image_to_plot_axis_map = None
+        self._plotxy_affine = None
+        self._plotdatacrs_affine = None
+        self._image_to_plotdata_axis_map = None
+        self._plotdata_to_image_axis_map = None
+        self._crs_identity = False
+        self._voxel_to_world_affine = None
+        image3D_obj = self._active_image3D
+        if image3D_obj is None:
+            return
+        # Image3D.voxel_to_world() applies the image's affine. Probe it at the origin and the unit voxel steps once, so
+        # that _voxel_to_world() can do the same with a few float operations instead of a numpy call per mouse move
+        if hasattr(image3D_obj, "voxel_to_world"):
+            try:
+                origin = tuple(float(v) for v in image3D_obj.voxel_to_world(np.zeros(3)))
+                steps = tuple(tuple(float(v) - o for v, o in zip(image3D_obj.voxel_to_world(unit), origin))
+                              for unit in np.eye(3))
+                self._voxel_to_world_affine = (origin,) + steps
+            except Exception:
+                self._voxel_to_world_affine = None
+        # plotdatacr_to_plotxy() flips each axis independently, plot_x = sx * col + tx and plot_y = sy * row + ty, and
+        # so does plotxyz_to_plotdatacrs(). Probe their orientation branches (taken while the affines are None) once,
+        # so later calls skip them
+        origin = self.plotdatacr_to_plotxy(0, 0)
+        if origin is not None:
+            unit = self.plotdatacr_to_plotxy(1, 1)
+            self._plotxy_affine = (int(unit[0] - origin[0]), int(origin[0]), int(unit[1] - origin[1]), int(origin[1]))
+        origin = self.plotxyz_to_plotdatacrs(0, 0, 0)
+        if origin is not None:
+            unit = self.plotxyz_to_plotdatacrs(1, 1, 1)
+            self._plotdatacrs_affine = tuple(v for k in range(3) for v in (int(unit[k] - origin[k]), int(origin[k])))
+        # the plot data <-> Image3D conversions also permute the axes (the plot data is a transposed Image3D volume)
+        self._image_to_plotdata_axis_map = self._signed_axis_map(self.imagecrs_to_plotdatacrs)
+        self._plotdata_to_image_axis_map = self._signed_axis_map(self.plotdatacrs_to_imagecrs)
+        # the common case (image stored in the display convention, viewed axially) needs no arithmetic at all. Set last,
+        # as the probes above must run the orientation branches
+        self._crs_identity = self._image_to_plotdata_axis_map == ((0, 1, 0), (1, 1, 0), (2, 1, 0))
+        # plot (x, y, slice) -> Image3D (col, row, slice), i.e. plotxyz_to_plotdatacrs() followed by
+        # plotdatacrs_to_imagecrs(), fused into a single map for _mouse_move()
+        self._plot_to_image_axis_map = self._signed_axis_map(self._plotxyz_to_imagecrs)
+        # and the reverse, for drawing markers (_imagecrs_to_plotxy_batch())
+        self._image_to_plot_axis_map = self._signed_axis_map(self._imagecrs_to_plotxyz)
+
+    def _plotxyz_to_imagecrs(self, plot_x, plot_y, plot_z):
+        """plotxyz_to_plotdatacrs() followed by plotdatacrs_to_imagecrs(); None if either conversion is undefined."""
+        crs = self.plotxyz_to_plotdatacrs(plot_x, plot_y, plot_z)
+        if crs is None:
+            return None
+        return self.plotdatacrs_to_imagecrs(crs[0], crs[1], crs[2])
+
+    def _imagecrs_to_plotxyz(self, voxel_col, voxel_row, voxel_slice):
+        """imagecrs_to_plotdatacrs() followed by plotdatacr_to_plotxy(); (plot_x, plot_y, plot_data_slice), or None if
+        either conversion is undefined."""
+        crs = self.imagecrs_to_plotdatacrs(voxel_col, voxel_row, voxel_slice)
+        if crs is None:
+            return None
+        plot_xy = self.plotdatacr_to_plotxy(crs[0], crs[1])
+        if plot_xy is None:
+            return None
+        return plot_xy[0], plot_xy[1], crs[2]
+
+    def _imagecrs_to_plotxy_batch(self, voxel_cols, voxel_rows, voxel_slices):
+        """
+        Vectorized imagecrs_to_plotdatacrs() + plotdatacr_to_plotxy() for arrays of Image3D (col, row, slice)
+        coordinates.
+
+        :return: (plot_x, plot_y) arrays, or None if there is no background image or no mapping for the display
+            convention
+        """
+        axis_map = self._image_to_plot_axis_map
+        if axis_map is None:
+            return None
+        crs = (voxel_cols, voxel_rows, voxel_slices)
+        (src_x, sign_x, offset_x), (src_y, sign_y, offset_y) = axis_map[0], axis_map[1]
+        return sign_x * crs[src_x] + offset_x, sign_y * crs[src_y] + offset_y
+
+    @staticmethod
+    def _signed_axis_map(convert):
+        """
+        Every coordinate conversion of this class maps each output axis to exactly one input axis, possibly flipped
+        (out_k = in_src or size - 1 - in_src). Find that map for convert(a, b, c) by evaluating it at the origin and
+        the three unit vectors.
+
+        :param convert: callable taking three ints and returning three ints, or None
+        :return: ((src, sign, offset), ...) for each output axis k, such that out_k = sign * in[src] + offset, or None
+            if convert returns None
+        """
+        origin = convert(0, 0, 0)
+        if origin is None:
+            return None
+        units = (convert(1, 0, 0), convert(0, 1, 0), convert(0, 0, 1))
+        axis_map = []
+        for k in range(3):
+            for src in range(3):
+                sign = int(units[src][k]) - int(origin[k])
+                if sign != 0:
+                    axis_map.append((src, sign, int(origin[k])))
+                    break
+        return tuple(axis_map)
+
     def _view_axis_index(self):
         # im3d_crs order is (col, row, slc) == (x, y, z)
         if self.view_dir == ViewDir.AX.dir:
@@ -1398,20 +1640,27 @@ class Viewport(QWidget):
         Update the coordinates label; keep field names, blank numbers if None.
         World fields use one decimal place and switch to R/A/S when display_convention == 'RAS'.
         Displays on two lines: patient coordinates on top, voxel coordinates below.
+        col, row and slc must be ints (callers cast once) or None.
         """
+        # mouse moves within one voxel repeat the same call - don't format the text again
+        key = (col, row, slc, world, self.display_convention)
+        if key == self._last_coords_key:
+            return
+        self._last_coords_key = key
+
         vox_w = getattr(self, "_vox_field_width", 3)
         world_w = getattr(self, "_world_field_width", 8)  # derived from world_sample in __init__
         prec = getattr(self, "_world_prec", 1)
 
         def fmt_int(v):
-            return f"{int(v):>{vox_w}d}" if isinstance(v, (int, np.integer)) else " " * vox_w
+            return f"{v:>{vox_w}d}" if v is not None else " " * vox_w
 
         def fmt_float(v):
             return f"{float(v):>{world_w}.{prec}f}" if (v is not None) else " " * world_w
 
         # world (patient) coordinate labels - first line
         labels = ("x", "y", "z")
-        if getattr(self, "display_convention", "").upper() == "RAS":
+        if self.display_convention.upper() == "RAS":
             labels = ("R", "A", "S")
         if world is not None and len(world) == 3:
             x, y, z = world
@@ -1423,16 +1672,48 @@ class Viewport(QWidget):
         # image (voxel) coordinate labels - second line
         vox_txt = f"col:{fmt_int(col)} row:{fmt_int(row)} slice:{fmt_int(slc)}"
 
-        # Combine with newline: patient coordinates on top, voxel coordinates below
-        self.coordinates_label.setText(world_txt + "\n" + vox_txt)
+        # Combine with newline: patient coordinates on top, voxel coordinates below. setText() re-lays out and repaints
+        # the label, so skip it if the text is unchanged
+        text = world_txt + "\n" + vox_txt
+        if text == self._last_coords_text:
+            return
+        self._last_coords_text = text
+        self.coordinates_label.setText(text)
 
     def _slice_changed(self):
-        """Update current slice and overlays, update coordinates display."""
+        """Throttle slice changes: process this one now, unless one was processed less than ~16 ms ago, in which case
+        it is deferred (and coalesced with any that follow) until the throttle timer fires. slice_changed_signal is
+        emitted when the change is processed, so for a deferred change it arrives asynchronously, from the timer, and
+        only for the latest index. current_slice_index is updated right away though, as the ImageView already shows
+        the new slice: refresh(), marking and painting in the meantime must act on that slice, not the last processed
+        one."""
         if self.background_image_index is None:
             return
 
         self.current_slice_index = self.image_view.currentIndex
-        self.refresh_preserve_extent()
+        if self._slice_change_timer.isActive():
+            self._pending_slice_change = True
+            return
+
+        self._slice_changed_flush()
+        self._slice_change_timer.start()
+
+    def _slice_change_timeout(self):
+        """Process the latest deferred slice change, if any, and keep throttling."""
+        if not self._pending_slice_change:
+            return
+        self._pending_slice_change = False
+        if self.background_image_index is None:
+            return
+        self._slice_changed_flush()
+        self._slice_change_timer.start()
+
+    def _slice_changed_flush(self):
+        """Update current slice and overlays, update coordinates display, and emit slice_changed_signal."""
+        self.current_slice_index = self.image_view.currentIndex
+        # the ImageView has already moved the background image to the new slice. _update_overlays() only re-slices the
+        # overlays if the slice really changed (e.g. not when the timeLine was dragged within one slice)
+        self._update_overlays()
 
         # If we know the last plot (x,y) and the mouse was inside, recompute voxel + world
         if self._last_mouse_inside:
@@ -1442,9 +1723,9 @@ class Viewport(QWidget):
                 if crs is not None:
                     img = self.plotdatacrs_to_imagecrs(crs[0], crs[1], crs[2])
                     if img is not None:
-                        bg_img = self.image3D_obj_stack[self.background_image_index]
-                        if bg_img is not None and hasattr(bg_img, "voxel_to_world"):
-                            wx, wy, wz = bg_img.voxel_to_world(np.array([int(img[0]), int(img[1]), int(img[2])]))
+                        bg_img = self._active_image3D
+                        if self._voxel_to_world_affine is not None:  # the background has voxel_to_world()
+                            wx, wy, wz = self._voxel_to_world(bg_img, img[0], img[1], img[2])
                             self._set_coords_label(int(img[0]), int(img[1]), int(img[2]), world=(wx, wy, wz))
                         else:
                             self._set_coords_label(int(img[0]), int(img[1]), int(img[2]), None)
@@ -1457,24 +1738,25 @@ class Viewport(QWidget):
     def _update_overlays(self):
         """
         When the slice index has changed, manually update the overlay image(s) with the corresponding slice from
-        the array3D. If slice index is out of range of overlay data, just return.
+        the array3D, and the markers. The background image is expected to be on the new slice already (the ImageView
+        moves it along with the timeLine). This is all a slice change needs - unlike refresh(), nothing is re-set.
 
         :return:
         """
-        if self.background_image_index == self.num_vols_allowed - 1:
-            # the bottom image is at the top of the stack - there are no overlay images
+        if self.background_image_index is None:
             return
 
-        # loop through images in the stack above the background image
         # Note: _update_overlays() is called from _slice_changed(), which doesn't have use_blend_opacity context
         # We'll use an instance variable to track this, or default to False for internal calls
         use_blend_opacity = getattr(self, '_use_blend_opacity', False)
-        for layer_index in range(self.background_image_index + 1, self.num_vols_allowed):
-            if self.image3D_obj_stack[layer_index] is not None:
-                self._update_overlay_slice(layer_index, use_blend_opacity=use_blend_opacity)
-            else:
-                if self.array2D_stack[layer_index] is not None:
-                    self.array2D_stack[layer_index].clear()
+        if int(self.current_slice_index) != self._last_rendered_slice:
+            # display settings may have been edited in place, pick them up as refresh() would (no-op if unchanged)
+            self._apply_display_settings(self.image_view.getImageItem(), self._active_image3D, use_blend_opacity)
+            # loop through images in the stack above the background image
+            for layer_index in self._active_indices:
+                if layer_index != self.background_image_index:
+                    self._update_overlay_slice(layer_index, use_blend_opacity=use_blend_opacity)
+            self._last_rendered_slice = int(self.current_slice_index)
 
         self._update_markers_display()
 
@@ -1499,37 +1781,108 @@ class Viewport(QWidget):
             image_item.clear()
             return
 
-        # Apply the slice to the overlay ImageItem
-        overlay_slice = overlay_data[idx, :, :]
-        image_item.setImage(overlay_slice)
+        if not image_item.isVisible():
+            # hidden layer (hide_layer): nothing to draw, so don't upload the slice. show_layer() brings it up to date.
+            return
+
+        # Apply the slice to the overlay ImageItem. overlay_data[idx] is a view, not a copy. Levels are applied (once)
+        # below, so don't let pyqtgraph scan the slice for its min/max; auto-downsampling is left as set by
+        # _apply_display_settings(). No output buffer needs to be managed here: the ImageItem keeps its ARGB processing
+        # buffer between renders as long as the slice shape doesn't change.
+        overlay_slice = overlay_data[idx]
+        image_item.setImage(overlay_slice, autoLevels=False)
+
+        self._apply_display_settings(image_item, overlay_image_object, use_blend_opacity)
 
-        #  levels and opacity
+    def _set_volume(self, im_data, im_obj):
+        """
+        Display a 3D volume in the ImageView at the display levels of its Image3D object. pyqtgraph's auto-levelling
+        would read the whole volume for its min/max only for the levels to be replaced, and its auto-range would reset
+        the view, so both are left to the caller.
+
+        :param im_data: 3D array (slices, cols, rows), as in array3D_stack
+        :param im_obj: Image3D object of im_data
+        """
+        levels = (getattr(im_obj, "display_min", im_obj.data_min), getattr(im_obj, "display_max", im_obj.data_max))
+        self.image_view.setImage(im_data, autoLevels=False, autoRange=False, autoHistogramRange=False, levels=levels)
+        # the new ImageItem state may not match what _apply_display_settings() last applied - let it re-apply the levels
+        self._forget_item_state(self.image_view.getImageItem(), "levels")
+
+    def _apply_display_settings(self, image_item, im_obj, use_blend_opacity=False):
+        """
+        Apply the display settings of an Image3D object (levels, opacity, lut or colormap, auto-downsampling) to an
+        ImageItem, skipping any setting that is unchanged since it was last applied.
+
+        :param image_item: pg.ImageItem displaying (a slice of) im_obj
+        :param im_obj: Image3D object
+        :param use_blend_opacity: If True, use blend_opacity instead of opacity for Image3D objects
+        """
         # if the Image3D object does not have display-related information, then set some defaults
-        disp_min = getattr(overlay_image_object, "display_min", overlay_image_object.data_min)
-        disp_max = getattr(overlay_image_object, "display_max", overlay_image_object.data_max)
+        disp_min = getattr(im_obj, "display_min", im_obj.data_min)
+        disp_max = getattr(im_obj, "display_max", im_obj.data_max)
         # Use blend_opacity if flag is set and attribute exists, otherwise use opacity
-        if use_blend_opacity and hasattr(overlay_image_object, "blend_opacity"):
-            opacity = getattr(overlay_image_object, "blend_opacity", 1.0)
+        if use_blend_opacity and hasattr(im_obj, "blend_opacity"):
+            opacity = getattr(im_obj, "blend_opacity", 1.0)
         else:
-            opacity = getattr(overlay_image_object, "opacity", 1.0)
-        lut = getattr(overlay_image_object, "lut", None)
+            opacity = getattr(im_obj, "opacity", 1.0)
+        lut = getattr(im_obj, "lut", None)
 
         # Fixed levels prevent per-slice LUT rescaling
-        image_item.setLevels([disp_min, disp_max])
-        image_item.setOpacity(opacity)
+        if self._item_state_changed(image_item, "levels", (disp_min, disp_max)):
+            image_item.setLevels([disp_min, disp_max])
+        if self._item_state_changed(image_item, "opacity", opacity):
+            image_item.setOpacity(opacity)
         if isinstance(lut, np.ndarray):
-            image_item.setLookupTable(lut)
+            # LUT path (works for discrete & continuous)
+            if self._item_state_changed(image_item, "lut", lut):
+                # hand pyqtgraph a copy: it ignores a LUT that is the same object as its current one, and the
+                # DiscreteColorsWidget edits its LUT in place
+                image_item.setLookupTable(lut.copy())
+        elif getattr(im_obj, "colormap_kind", None) == "continuous":
+            # optional fallback if you ever store names for continuous: try name only if you know pyqtgraph has it
+            name = getattr(im_obj, "colormap_source", None)
+            if isinstance(name, str) and self._item_state_changed(image_item, "lut", name):
+                image_item.setColorMap(name)
+        # when zoomed out, let pyqtgraph render a view-sized, averaged copy of the slice instead of the full slice.
+        # Averaging would blend discrete label values though, so not for images displayed through a (label) LUT
+        # unless they are known to use a continuous colormap
+        colormap_kind = getattr(im_obj, "colormap_kind", None)
+        auto_downsample = colormap_kind == "continuous" or (colormap_kind is None and not isinstance(lut, np.ndarray))
+        if self._item_state_changed(image_item, "downsample", auto_downsample):
+            image_item.setAutoDownsample(auto_downsample)
+
+    def _item_state_changed(self, image_item, key, value):
+        """
+        Compare a display setting (key = 'levels', 'opacity', 'lut' or 'downsample') against the value last applied to
+        this ImageItem. If it differs, remember the new value and return True, meaning that the caller should apply it.
+        LUT arrays are compared by content against a copy of the one last applied (at most 256 x 4 bytes), so a LUT
+        edited in place is picked up; everything else (including colormap names) is compared by equality.
+
+        :param image_item: pg.ImageItem
+        :param key: str
+        :param value: the value about to be applied
+        :return: bool
+        """
+        state = self._applied_state.setdefault(id(image_item), {})
+        if key in state:
+            last = state[key]
+            if isinstance(value, np.ndarray):
+                if isinstance(last, np.ndarray) and last.dtype == value.dtype and np.array_equal(last, value):
+                    return False
+            elif type(last) is type(value) and last == value:
+                return False
+        state[key] = value.copy() if isinstance(value, np.ndarray) else value
+        return True
+
+    def _forget_item_state(self, image_item, key=None):
+        """
+        Invalidate the cached display setting for this ImageItem (all settings if key is None). Call this after
+        anything that changes the ImageItem's state behind our back, e.g. setImage() with auto-levelling.
+        """
+        if key is None:
+            self._applied_state.pop(id(image_item), None)
         else:
-            if getattr(overlay_image_object, "colormap_kind", None) == "continuous" and isinstance(
-                    overlay_image_object.colormap_source, str):
-                lut = getattr(overlay_image_object, "lut", None)
-                if isinstance(lut, np.ndarray):
-                    image_item.setLookupTable(lut)  # works for discrete & continuous
-                else:
-                    name = getattr(overlay_image_object, "colormap_source", None)
-                    if isinstance(name, str):
-                        # optional: try name only if you know pyqtgraph has it
-                        image_item.setColorMap(name)
+            self._applied_state.get(id(image_item), {}).pop(key, None)
 
     def _update_image_object(self):
         """Update the display min and max of the active Image3D object.
@@ -1538,6 +1891,9 @@ class Viewport(QWidget):
         pass
 
     def _profile_method(self, method, *args, **kwargs):
+        # profiling is a debug-mode feature, so don't load the profiler modules unless it is used
+        import cProfile, pstats, io
+
         profiler = cProfile.Profile()
         profiler.enable()
 
@@ -1551,8 +1907,8 @@ class Viewport(QWidget):
 
     def _handle_out_of_bounds_persistent_label(self):
         idx = int(self.image_view.currentIndex)
-        axis = self._view_axis_index()
-        bg = self.image3D_obj_stack[self.background_image_index]
+        axis = self._view_axis
+        bg = self._active_image3D
 
         # Build a voxel triplet to evaluate world at:
         # - keep last valid in-plane indices if we have them, otherwise image center
@@ -1566,9 +1922,9 @@ class Viewport(QWidget):
 
         # Compute world, then blank two components (only keep the axis that persists)
         world = None
-        if hasattr(bg, "voxel_to_world"):
+        if self._voxel_to_world_affine is not None:  # the background has voxel_to_world()
             try:
-                wx, wy, wz = bg.voxel_to_world(np.array(im3d_for_world))
+                wx, wy, wz = self._voxel_to_world(bg, *im3d_for_world)
                 all_world = (wx, wy, wz)
                 masked = [None, None, None]
                 masked[axis] = all_world[axis]  # keep only the persistent axis
@@ -1588,6 +1944,20 @@ class Viewport(QWidget):
         self._set_coords_label(**kwargs)
         self._last_mouse_inside = False
 
+    def _voxel_to_world(self, image3D_obj, col, row, slc):
+        """Convert a voxel (col, row, slice) of image3D_obj to world coordinates. For the background image this uses the
+        affine cached by refresh(), otherwise image3D_obj.voxel_to_world() via the reusable voxel buffer."""
+        affine = self._voxel_to_world_affine
+        if affine is not None and image3D_obj is self._active_image3D:
+            (ox, oy, oz), (cx, cy, cz), (rx, ry, rz), (sx, sy, sz) = affine
+            return (ox + cx * col + rx * row + sx * slc,
+                    oy + cy * col + ry * row + sy * slc,
+                    oz + cz * col + rz * row + sz * slc)
+        self._vox_buf[0] = col
+        self._vox_buf[1] = row
+        self._vox_buf[2] = slc
+        return image3D_obj.voxel_to_world(self._vox_buf)
+
     def _scatter_mouse_press(self, evt, mkr):
         """
         When user presses on a marker. If the marker is already selected and in edit mode, allow it to be dragged.
@@ -1630,6 +2000,7 @@ class Viewport(QWidget):
                     self.marker_select(mkr, True)
 
     def _mouse_press_wrapper(self, event):
+        """Run _mouse_press under the profiler. Only installed as the scene's mousePressEvent in debug mode."""
         self._profile_method(self._mouse_press, event)
 
     def _mouse_press(self, event):
@@ -1686,12 +2057,9 @@ class Viewport(QWidget):
 
     def _mouse_move(self, event):
         # -------- guards & setup -------------------------------------------------
-        if self.background_image_index is None:
-            # Still let the default ViewBox behavior run for panning/zoom, etc.
-            return self.original_mouse_move(event)
-
-        bg = self.image3D_obj_stack[self.background_image_index]
+        bg = self._active_image3D
         if bg is None:
+            # Still let the default ViewBox behavior run for panning/zoom, etc.
             return self.original_mouse_move(event)
 
         # NEW guard: if left button pressed and not in marker drag mode, skip coords
@@ -1699,21 +2067,8 @@ class Viewport(QWidget):
             # let ViewBox handle panning/zoom/etc., but do not update coords
             return self.original_mouse_move(event)
 
-        # Ensure we get move events even without a button pressed (usually true, but harmless)
-        try:
-            self.image_view.getView().setMouseTracking(True)
-            self.image_view.getView().viewport().setMouseTracking(True)
-        except Exception:
-            pass
-
-        # Lazy init throttling state (~60 FPS)
-        if not hasattr(self, "_drag_hz_timer"):
-            from PyQt5 import QtCore
-            self._drag_hz_timer = QtCore.QElapsedTimer()
-            self._drag_hz_timer.start()
-            self._drag_throttle_ms = 16  # ~60 Hz
-
-        do_heavy = self._drag_hz_timer.elapsed() >= getattr(self, "_drag_throttle_ms", 16)
+        # Throttle heavy conversions/label updates to ~60 Hz (decided once, for every branch below)
+        do_heavy = self._drag_hz_timer.elapsed() >= self._drag_throttle_ms
 
         # -------- hit testing & mapping -----------------------------------------
         scene_xy = event.scenePos()
@@ -1732,34 +2087,22 @@ class Viewport(QWidget):
         plot_pt = imv_item.mapFromScene(scene_xy)
         plot_x, plot_y = int(plot_pt.x()), int(plot_pt.y())
 
-        # Pixel de-dup: if we haven't moved to a new plot pixel, only do throttled label tick / brush flow
-        same_pixel = (getattr(self, "_last_plot_x", None) == plot_x and
-                      getattr(self, "_last_plot_y", None) == plot_y)
-
-        # Map plot -> plot-data CRS (x,y,slice) and then -> image (c,r,s)
-        imv_crs = self.plotxyz_to_plotdatacrs(plot_x, plot_y, self.current_slice_index)
-        if imv_crs is None:
-            if do_heavy:
-                self._handle_out_of_bounds_persistent_label()
-                self._drag_hz_timer.restart()
-            return self.original_mouse_move(event)
-
-        im3d_crs = self.plotdatacrs_to_imagecrs(imv_crs[0], imv_crs[1], imv_crs[2])
-        if im3d_crs is None:
+        # Map plot (x,y,slice) -> plot-data CRS -> image (c,r,s), in one step with the map cached by refresh()
+        axis_map = self._plot_to_image_axis_map
+        if axis_map is None:
             if do_heavy:
                 self._handle_out_of_bounds_persistent_label()
                 self._drag_hz_timer.restart()
             return self.original_mouse_move(event)
 
-        c, r, s = int(im3d_crs[0]), int(im3d_crs[1]), int(im3d_crs[2])
+        plot_xyz = (plot_x, plot_y, int(self.current_slice_index))
+        c, r, s = (sign * plot_xyz[src] + offset for src, sign, offset in axis_map)
 
         # -------- coordinate label + world conversion ---------------------------
-        # ---- Throttle heavy conversions/label updates to ~60 Hz ----
-        do_heavy = self._drag_hz_timer.elapsed() >= getattr(self, "_drag_throttle_ms", 16)
         world = None
-        if do_heavy and hasattr(bg, "voxel_to_world"):
-            try: # Avoid small numpy allocations in hot path (tuple->list->array is cheap enough)
-                wx, wy, wz = bg.voxel_to_world(np.array([c, r, s], dtype=np.int32))
+        if do_heavy and self._voxel_to_world_affine is not None:
+            try:  # no numpy in the hot path: _voxel_to_world() uses the affine cached by refresh()
+                wx, wy, wz = self._voxel_to_world(bg, c, r, s)
                 world = (wx, wy, wz)
                 self._last_valid_world = world
             except Exception:
@@ -1843,8 +2186,9 @@ class Viewport(QWidget):
             # FIXME: notify user that no layer is selected for painting?
             return
 
+        slice_index = int(self.image_view.currentIndex)
         data = self.array3D_stack[self.canvas_layer_index]
-        data_slice = data[int(self.image_view.currentIndex), :, :]  # arrays have been transposed - slice is first dim
+        data_slice = data[slice_index, :, :]  # arrays have been transposed - slice is first dim
 
         # Define the range for the brush area
         half_brush = self.paint_brush.get_size() // 2
@@ -1857,36 +2201,102 @@ class Viewport(QWidget):
         x_end = min(data_slice.shape[0], x + half_brush + 1)
         y_start = max(0, y - half_brush)
         y_end = min(data_slice.shape[1], y + half_brush + 1)
+        if x_start >= x_end or y_start >= y_end:
+            return  # brush is entirely outside the slice
 
-        # Create a mask for the brush area within the bounds of data
+        # Create a mask for the brush area within the bounds of data: the part of the brush footprint that overlaps the
+        # slice, restricted to the label values that can be painted
         brush_area = data_slice[x_start:x_end, y_start:y_end]
-
-        allowed_values = np.array(self.canvas_labels)  # array of label values that can be painted
-        mask = np.isin(brush_area, allowed_values)
-
-        # apply active label or 0 to canvas, depending on painting or erasing
-        if painting:
-            brush_area[mask] = self.paint_brush.get_value()
+        brush_mask = self._get_brush_mask(half_brush)
+        mask_x0 = x_start - (x - half_brush)
+        mask_y0 = y_start - (y - half_brush)
+        footprint = brush_mask[mask_x0:mask_x0 + brush_area.shape[0], mask_y0:mask_y0 + brush_area.shape[1]]
+
+        # apply active label or 0 to canvas, depending on painting or erasing (assumes null value is 0)
+        fill_value = self.paint_brush.get_value() if painting else 0
+        # brush_area is deliberately left as a (possibly strided) view: a contiguous copy would not write through to
+        # the 3D array. Both the compiled stamp and the lookup table index it in place.
+        stamp_brush = _get_stamp_brush_kernel() if brush_area.dtype in _LABEL_LUT_DTYPES else None
+        if (stamp_brush is not None and 0 <= fill_value <= np.iinfo(brush_area.dtype).max and
+                float(fill_value).is_integer()):
+            # label image: test and write each pixel in one compiled pass
+            stamp_brush(brush_area, footprint, self._canvas_label_lut_for(brush_area.dtype), int(fill_value))
         else:
-            # erasing
-            brush_area[mask] = 0  # assumes null value is 0
+            np.putmask(brush_area, footprint & self._canvas_label_mask(brush_area), fill_value)
 
-        # update only the modified slice in the 3D array
-        # TODO: this is where we can implement an undo stack, saving changes to one slice at a time
+        # data_slice (and so brush_area) is a view into the 3D array, so only the pixels under the brush have been
+        # written - there is no need to copy the whole slice back into the 3D array
+        # TODO: this is where we can implement an undo stack. Only the brush bounding box changes, so saving
+        #  (slice index, x_start:x_end, y_start:y_end, copy of brush_area before the putmask) is enough per stamp
         # FIXME: this seems to be directly modifying the image3D object, which is not what we want
-        data[int(self.image_view.currentIndex), :, :] = data_slice
 
-        # update the appropriate ImageView ImageItem
-        # preserve the current zoom and pan state, prevents image from resetting to full extent
-        view_range = self.image_view.view.viewRange()
+        # update the appropriate ImageView ImageItem. Neither re-rendering the background slice nor setting a same-shape
+        # overlay slice changes the view range, so the zoom and pan state only needs restoring after a full setImage
         if self.canvas_layer_index == self.background_image_index:
-            slice_index = int(self.image_view.currentIndex)
-            self.image_view.setImage(data)
-            self.image_view.setCurrentIndex(slice_index)
+            if self.image_view.image is data:
+                # the ImageView displays this very array, and its ImageItem holds a view of the current slice, so the
+                # brush stroke is already in place - just have the ImageItem re-render, keeping its levels
+                self.image_view.getImageItem().updateImage()
+            else:
+                # preserve the current zoom and pan state, prevents image from resetting to full extent
+                view_range = self.image_view.view.viewRange()
+                self._set_volume(data, self.image3D_obj_stack[self.canvas_layer_index])
+                self.image_view.setCurrentIndex(slice_index)
+                self.image_view.view.setRange(xRange=view_range[0], yRange=view_range[1],
+                                              padding=0)
         else:
-            self.array2D_stack[self.canvas_layer_index].setImage(data_slice)
-        self.image_view.view.setRange(xRange=view_range[0], yRange=view_range[1],
-                                      padding=0)
+            image_item = self.array2D_stack[self.canvas_layer_index]
+            shown = image_item.image
+            if (shown is not None and shown.shape == data_slice.shape and shown.strides == data_slice.strides and
+                    shown.__array_interface__['data'][0] == data_slice.__array_interface__['data'][0]):
+                # the overlay ImageItem already holds a view of this slice (see _update_overlay_slice), so the stroke
+                # is in place - just re-render it
+                image_item.updateImage()
+            else:
+                # levels were applied by _update_overlay_slice(), keep them
+                image_item.setImage(data_slice, autoLevels=False)
+
+    def _canvas_label_mask(self, brush_area):
+        """
+        Boolean mask of the pixels of brush_area whose value is one of the paintable canvas labels. For uint8 and uint16
+        canvases (label images) this is a lookup in a table over every value of the dtype, rebuilt only when
+        canvas_labels changes; other dtypes fall back to np.isin.
+        """
+        if brush_area.dtype not in _LABEL_LUT_DTYPES:
+            labels = tuple(self.canvas_labels)
+            if labels != self._canvas_labels_arr_key:
+                self._canvas_labels_arr = np.array(labels)
+                self._canvas_labels_arr_key = labels
+            return np.isin(brush_area, self._canvas_labels_arr)
+        return self._canvas_label_lut_for(brush_area.dtype)[brush_area]
+
+    def _canvas_label_lut_for(self, dtype):
+        """Boolean table with one entry per value of the uint8/uint16 dtype, True at the values in canvas_labels."""
+        key = (tuple(self.canvas_labels), np.dtype(dtype))
+        if key != self._canvas_label_lut_key:
+            max_value = np.iinfo(dtype).max
+            self._canvas_label_lut = np.zeros(max_value + 1, dtype=bool)
+            for label in key[0]:
+                # same matches as np.isin: only whole numbers in the dtype's range can equal one of its values
+                if 0 <= label <= max_value and float(label).is_integer():
+                    self._canvas_label_lut[int(label)] = True
+            self._canvas_label_lut_key = key
+        return self._canvas_label_lut
+
+    def _get_brush_mask(self, half_brush):
+        """
+        Return the footprint of the current paint brush as a (2 * half_brush + 1) square boolean array, centered on the
+        brush position. Square brushes fill the whole array, circular brushes a disc of radius half_brush.
+        """
+        key = (half_brush, self.paint_brush.shape)
+        if key != self._brush_mask_key:
+            if self.paint_brush.shape == 'circle':
+                offsets = np.arange(-half_brush, half_brush + 1)
+                self._brush_mask = (offsets[:, None] ** 2 + offsets[None, :] ** 2) <= half_brush ** 2
+            else:
+                self._brush_mask = np.ones((2 * half_brush + 1, 2 * half_brush + 1), dtype=bool)
+            self._brush_mask_key = key
+        return self._brush_mask
 
     def _update_markers_display(self):
         """
@@ -1901,39 +2311,45 @@ class Viewport(QWidget):
         # get markers for the current slice
         current_slice = int(self.image_view.currentIndex)
         markers = self.slice_markers.get(current_slice, [])
+        if not markers:
+            # common case when scrolling: nothing to draw. Only clear the scatter item if it is showing something.
+            if self._last_markers_key is not None:
+                self.scatter.clear()
+                self._last_markers_key = None
+            return
 
-        # update ScatterPlotItem
-        spots = []
-        if len(markers) > 0:
-            for marker in markers:
-                image_data_crs = self.imagecrs_to_plotdatacrs(marker['image_col'], marker['image_row'], marker['image_slice'])
-                if image_data_crs is None:
-                    continue
-                plot_xy = self.plotdatacr_to_plotxy(image_data_crs[0], image_data_crs[1])
-                if plot_xy is None:
-                    continue
-                # Determine brush and pen colors based on marker state
-                if marker['is_selected']:
-                    if self._edit_mode:
-                        marker_brush = self.temp_brush  # editing color - draggable
-                        marker_pen = self.temp_pen
-                    else:
-                        marker_brush = self.selected_brush  # selected color
-                        marker_pen = self.selected_pen
-                else:
-                    marker_brush = self.idle_brush  # idle color - not selected
-                    marker_pen = self.idle_pen
-                
-                spots.append(
-                    {
-                        'pos': (plot_xy[0], plot_xy[1]), 'data': marker,
-                        'brush': marker_brush,
-                        'pen': marker_pen,
-                    } )
-
-            # FIXME: testing and debugging
-            # print(f"spots: {spots}")
+        # read the marker dicts once: (col, row, slice, is_selected) per marker. The dicts stay the canonical marker
+        # records (they are passed around in signals, and may be edited in place by the host application)
+        marker_fields = [(marker['image_col'], marker['image_row'], marker['image_slice'], marker['is_selected'])
+                         for marker in markers]
 
-            self.scatter.setData(spots=spots)
+        # skip rebuilding the scatter spots if nothing that affects them has changed since they were last drawn
+        markers_key = (current_slice, self._edit_mode, id(self._active_image3D),
+                       self.idle_brush, self.idle_pen, self.selected_brush, self.selected_pen, self.temp_brush,
+                       self.temp_pen, tuple(map(id, markers)), tuple(marker_fields))
+        if markers_key == self._last_markers_key:
+            return
+        self._last_markers_key = markers_key
+
+        # update ScatterPlotItem. Every spot shares one of these brushes/pens (index 0: idle color - not selected,
+        # index 1: selected color, or editing color - draggable), so pyqtgraph only ever sees a couple of distinct
+        # styles (one symbol atlas entry each)
+        style_brushes = np.empty(2, dtype=object)
+        style_pens = np.empty(2, dtype=object)
+        if self._edit_mode:
+            style_brushes[:] = (self.idle_brush, self.temp_brush)
+            style_pens[:] = (self.idle_pen, self.temp_pen)
+        else:
+            style_brushes[:] = (self.idle_brush, self.selected_brush)
+            style_pens[:] = (self.idle_pen, self.selected_pen)
+        # one column per field (struct of arrays), then transform all marker positions at once
+        fields = np.array(marker_fields, dtype=float)
+        plot_xy = self._imagecrs_to_plotxy_batch(fields[:, 0], fields[:, 1], fields[:, 2])
+
+        if plot_xy is not None:
+            # Determine brush and pen colors based on marker state
+            style_index = fields[:, 3].astype(np.intp)
+            self.scatter.setData(x=plot_xy[0], y=plot_xy[1], data=markers,
+                                 brush=style_brushes[style_index], pen=style_pens[style_index])
         else:
             self.scatter.clear()